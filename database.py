@@ -5,7 +5,10 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import BulkWriteError
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
@@ -21,16 +24,84 @@ db = None
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
+# Upper bound on server-side execution time for reads
+QUERY_MAX_TIME_MS = int(os.getenv("MONGO_QUERY_MAX_TIME_MS", 1500))
+
+# Per-worker pool: size for one worker's in-flight queries; total = workers x MONGO_MAX_POOL_SIZE.
+# Keep the idle floor small since it is also multiplied by the worker count.
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 2))
+
+
+class _PoolStats(monitoring.ConnectionPoolListener):
+    """Counts open and checked-out connections across the client's pools"""
+
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.open -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+
+_pool_stats = _PoolStats()
+
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    _client = AsyncIOMotorClient(
+        database_url,
+        maxPoolSize=MAX_POOL_SIZE,
+        minPoolSize=MIN_POOL_SIZE,
+        maxIdleTimeMS=30000,
+        waitQueueTimeoutMS=2000,
+        serverSelectionTimeoutMS=3000,
+        event_listeners=[_pool_stats],
+    )
     db = _client[database_name]
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
+def get_pool_stats() -> dict:
+    """Connection pool configuration and live usage counters"""
+    return {
+        "max_pool_size": MAX_POOL_SIZE,
+        "min_pool_size": MIN_POOL_SIZE,
+        "open_connections": _pool_stats.open,
+        "checked_out": _pool_stats.checked_out,
+        "checkout_failures": _pool_stats.checkout_failures,
+    }
+
+def _prepare_document(data: Union[BaseModel, dict]) -> dict:
+    """Convert to a dict and stamp created_at/updated_at"""
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
@@ -39,17 +110,150 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
 
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
+    return data_dict
 
-    result = db[collection_name].insert_one(data_dict)
+# Helper functions for common database operations
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    result = await db[collection_name].insert_one(_prepare_document(data))
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+async def get_document(collection_name: str, filter_dict: dict, projection: dict = None):
+    """Get a single document from collection, or None if nothing matches"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return await db[collection_name].find_one(filter_dict, projection, max_time_ms=QUERY_MAX_TIME_MS)
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, hint: str = None, projection: dict = None, sort: list = None):
+    """
+    Get documents from collection, optionally projected to the given fields.
+    Raises pymongo.errors.ExecutionTimeout if the query exceeds QUERY_MAX_TIME_MS.
+    """
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
     
-    cursor = db[collection_name].find(filter_dict or {})
+    cursor = db[collection_name].find(filter_dict or {}, projection).max_time_ms(QUERY_MAX_TIME_MS)
+    if hint:
+        cursor = cursor.hint(hint)
+    if sort:
+        cursor = cursor.sort(sort)
     if limit:
         cursor = cursor.limit(limit)
     
-    return list(cursor)
+    return await cursor.to_list(length=limit or None)
+
+async def run_once(name: str, migration) -> bool:
+    """
+    Run an async migration at most once per database.
+
+    The first caller claims a marker document in the "migration" collection and runs
+    it; other workers and later boots see the marker and skip. The marker is removed
+    again if the migration fails so the next boot retries. Returns True if it ran.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    claim = await db.migration.update_one(
+        {"_id": name},
+        {"$setOnInsert": {"started_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    if claim.upserted_id is None:
+        return False
+    try:
+        await migration()
+    except Exception:
+        await db.migration.delete_one({"_id": name})
+        raise
+    await db.migration.update_one({"_id": name}, {"$set": {"completed_at": datetime.now(timezone.utc)}})
+    return True
+
+
+class BatchWriter:
+    """
+    Coalesces single-document inserts into insert_many batches.
+
+    submit() queues a document and waits for the background task to write it;
+    a batch is flushed once it holds max_batch documents or max_wait_ms has
+    passed since its first document arrived.
+    """
+
+    def __init__(self, collection_name: str, max_batch: int = 200, max_wait_ms: int = 20):
+        self.collection_name = collection_name
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._task = None
+        self._stopping = False
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush whatever is queued and stop the background task"""
+        if self._task is None:
+            return
+        # Anything submitted from here on would land behind the sentinel and never
+        # be written, so submit() bypasses the queue once this is set
+        self._stopping = True
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, data: Union[BaseModel, dict]) -> str:
+        """Queue a document for insertion and return its inserted id"""
+        if self._task is None or self._stopping:
+            return await create_document(self.collection_name, data)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((_prepare_document(data), future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        docs = [doc for doc, _ in batch]
+        failed = {}
+        try:
+            # insert_many assigns _id on each dict in place
+            await db[self.collection_name].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                failed[err["index"]] = Exception(err.get("errmsg", "Write failed"))
+        except Exception as e:
+            failed = {i: e for i in range(len(batch))}
+
+        for i, (doc, future) in enumerate(batch):
+            if future.done():
+                continue
+            if i in failed:
+                future.set_exception(failed[i])
+            else:
+                future.set_result(str(doc["_id"]))
@@ -1,13 +1,27 @@
+import hashlib
+import logging
 import os
+import re
+import time
+from functools import lru_cache
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, Response
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+import orjson
+from pydantic import BaseModel, Field, TypeAdapter
+from bson import ObjectId
+from bson.regex import Regex
+from pymongo.errors import ExecutionTimeout
 
-from database import db, create_document, get_documents
+from database import db, create_document, get_document, get_documents, get_pool_stats, run_once, BatchWriter
 from schemas import Kitten, Inquiry, Testimonial
 
-app = FastAPI(title="Gentle Giant Maine Coon API")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Gentle Giant Maine Coon API", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,21 +32,140 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(ExecutionTimeout)
+async def query_timeout_handler(request: Request, exc: ExecutionTimeout):
+    return ORJSONResponse(status_code=504, content={"detail": "Database query timed out"})
+
+
+@app.on_event("startup")
+async def init_cache():
+    FastAPICache.init(InMemoryBackend(), prefix="api-cache")
+
+
+# Catalog GETs may be reused by browsers/CDNs briefly and revalidated with If-None-Match
+_CATALOG_CACHE_CONTROL = "public, max-age=30, stale-while-revalidate=300"
+
+
+def _conditional_json(request: Request, body: bytes) -> Response:
+    """JSON response with an ETag over the body; 304 if the client already has it"""
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": _CATALOG_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Inquiries arrive in bursts; coalesce them into insert_many round-trips
+inquiry_writer = BatchWriter("inquiry")
+
+
+@app.on_event("startup")
+async def start_batch_writers():
+    if db is not None:
+        inquiry_writer.start()
+
+
+@app.on_event("shutdown")
+async def stop_batch_writers():
+    await inquiry_writer.stop()
+
+
+# Missing status renders as KittenOut's default, so the backfill stores that default
+_STATUS_LC = {"$toLower": {"$ifNull": ["$status", "available"]}}
+_SEX_IS_STRING = {"$eq": [{"$type": "$sex"}, "string"]}
+
+
+async def _normalize_kitten_fields():
+    await db.kitten.update_many(
+        {"$or": [
+            {"color_lc": {"$exists": False}},
+            {"location_lc": {"$exists": False}},
+            {"$expr": {"$and": [_SEX_IS_STRING, {"$ne": ["$sex", {"$toLower": "$sex"}]}]}},
+            {"$expr": {"$ne": ["$status", _STATUS_LC]}},
+        ]},
+        [{"$set": {
+            # Non-string (missing/null) sex is left as it is
+            "sex": {"$cond": [_SEX_IS_STRING, {"$toLower": "$sex"}, "$sex"]},
+            "status": _STATUS_LC,
+            "color_lc": {"$toLower": "$color"},
+            "location_lc": {"$toLower": "$location"},
+        }}],
+    )
+
+
+async def backfill_kitten_fields():
+    """
+    Bring kittens stored before filter normalization in line with create_kitten:
+    lowercase sex/status and add color_lc/location_lc. The update scans the whole
+    collection, so it runs once per database rather than on every worker boot.
+    """
+    await run_once("kitten_filter_fields", _normalize_kitten_fields)
+
+
+@app.on_event("startup")
+async def warm_up():
+    """Pay connection and index setup costs before the first request does"""
+    if db is None:
+        return
+    # Warm-up is only an optimisation: if Mongo is unreachable the app still starts
+    # and /test reports the problem, as it did before
+    try:
+        await _warm_up_database()
+    except Exception as e:
+        logger.warning("Database warm-up failed: %s", e)
+
+
+async def _warm_up_database():
+    # Opens the first pool connections (minPoolSize fills in behind it)
+    await db.command("ping")
+    await db.kitten.create_index("color_lc")
+    await db.kitten.create_index("location_lc")
+    await db.kitten.create_index("sex")
+    # Serves status-filtered pages in _id order without an in-memory sort
+    await db.kitten.create_index([("status", 1), ("_id", -1)], name=KITTEN_STATUS_PAGE_INDEX)
+    # Compound indexes ordered coarsest -> finest to cover combined filters
+    await db.kitten.create_index(
+        [("status", 1), ("location_lc", 1), ("color_lc", 1), ("sex", 1)],
+        name=KITTEN_FILTER_INDEX,
+    )
+    await db.kitten.create_index([("color_lc", 1), ("status", 1)])
+    # Last, so a failing migration can't leave the indexes uncreated
+    await backfill_kitten_fields()
+
+
 @app.get("/")
 def read_root():
     return {"message": "Gentle Giant Maine Coon API Running"}
 
 
+# Health probes can hit /test every second; only list collections every few seconds
+_COLLECTIONS_TTL = 10.0
+_collections_cache = (0.0, None)
+
+
+async def _cached_collection_names() -> List[str]:
+    global _collections_cache
+    fetched_at, names = _collections_cache
+    if names is None or time.monotonic() - fetched_at > _COLLECTIONS_TTL:
+        names = await db.list_collection_names()
+        _collections_cache = (time.monotonic(), names)
+    return names
+
+
 # Health check + DB info
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
         "database_url": None,
         "database_name": None,
         "connection_status": "Not Connected",
-        "collections": []
+        "collections": [],
+        "pool": None
     }
 
     try:
@@ -41,8 +174,9 @@ def test_database():
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
             response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
+            response["pool"] = get_pool_stats()
             try:
-                collections = db.list_collection_names()
+                collections = await _cached_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -59,38 +193,123 @@ def test_database():
 # Kittens Endpoints
 # ------------------------------
 
+KITTEN_FILTER_INDEX = "status_loc_color_sex"
+KITTEN_STATUS_PAGE_INDEX = "status_id"
+
+
 class KittenOut(Kitten):
     id: Optional[str] = None
+    # Stored URLs were validated as HttpUrl on insert; don't re-parse them on every read
+    images: List[str] = Field(default_factory=list)
+
+
+# Only the fields KittenOut returns; _id is rendered server-side as the string id.
+# Optional fields fall back to KittenOut's defaults so listings, which skip the
+# model, have the same shape as the point lookup.
+KITTEN_PROJECTION = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "name": 1,
+    "color": 1,
+    "sex": 1,
+    "age_weeks": {"$ifNull": ["$age_weeks", None]},
+    "location": 1,
+    "giant": {"$ifNull": ["$giant", True]},
+    "price_usd": {"$ifNull": ["$price_usd", None]},
+    "status": {"$ifNull": ["$status", "available"]},
+    "images": {"$ifNull": ["$images", []]},
+    "description": {"$ifNull": ["$description", None]},
+}
+
+# Free-text filters are limited to plain words before they are turned into regexes;
+# empty values are allowed and mean "no filter"
+_FILTER_PATTERN = r"^[\w .,-]*$"
 
 
-@app.get("/api/kittens", response_model=List[KittenOut])
-def list_kittens(color: Optional[str] = None, location: Optional[str] = None, sex: Optional[str] = None, status: Optional[str] = None):
+@lru_cache(maxsize=256)
+def _prefix_regex(value: str) -> Regex:
+    """
+    Anchored prefix regex for a lowercased filter value, built once per value.
+    A bson Regex with no flags is used because a compiled re.Pattern always carries
+    re.UNICODE, which pymongo sends as the "u" option and which stops Mongo from
+    deriving tight index bounds from the prefix.
+    """
+    return Regex("^" + re.escape(value))
+
+
+# response_model=None skips FastAPI's second validation pass; `responses` keeps the schema in OpenAPI
+@app.get("/api/kittens", response_model=None, responses={200: {"model": List[KittenOut]}})
+async def list_kittens(
+    request: Request,
+    color: Optional[str] = Query(None, max_length=64, pattern=_FILTER_PATTERN),
+    location: Optional[str] = Query(None, max_length=64, pattern=_FILTER_PATTERN),
+    sex: Optional[str] = Query(None, max_length=64, pattern=_FILTER_PATTERN),
+    status: Optional[str] = Query(None, max_length=64, pattern=_FILTER_PATTERN),
+    limit: int = Query(24, ge=1, le=100),
+    cursor: Optional[str] = None,
+    sort: str = Query("-created_at", pattern="^-?created_at$"),
+):
+    """
+    Keyset-paginated kitten listing. Pass the id of the last kitten on a page as
+    `cursor` to fetch the next one.
+    """
     if db is None:
         return []
     query = {}
+    # ObjectIds grow with insertion time, so _id order is created_at order and
+    # gives a unique, indexed key to page on without .skip()
+    descending = sort.startswith("-")
+    if cursor:
+        if not ObjectId.is_valid(cursor):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query["_id"] = {"$lt" if descending else "$gt": ObjectId(cursor)}
+    # Anchored prefix matches on lowercased copies so Mongo can use an index range
     if color:
-        query["color"] = {"$regex": color, "$options": "i"}
+        query["color_lc"] = _prefix_regex(color.lower())
     if location:
-        query["location"] = {"$regex": location, "$options": "i"}
+        query["location_lc"] = _prefix_regex(location.lower())
+    # sex and status are stored lowercased, so plain equality is enough
     if sex:
-        query["sex"] = {"$regex": sex, "$options": "i"}
+        query["sex"] = sex.lower()
     if status:
-        query["status"] = status
+        query["status"] = status.lower()
+
+    # No hint: for a status equality sorted by _id the planner already prefers the
+    # status_id index, and a hint would fail outright if that index is missing
+    docs = await get_documents(
+        "kitten",
+        query,
+        limit,
+        projection=KITTEN_PROJECTION,
+        sort=[("_id", -1 if descending else 1)],
+    )
+    # The projection already yields exactly the KittenOut fields with a string id, and
+    # the documents were validated on insert, so hand them to orjson without models
+    return _conditional_json(request, orjson.dumps(docs))
 
-    docs = get_documents("kitten", query)
-    out: List[KittenOut] = []
-    for d in docs:
-        d["id"] = str(d.get("_id"))
-        d.pop("_id", None)
-        out.append(KittenOut(**d))
-    return out
+
+@app.get("/api/kittens/{kitten_id}", response_model=KittenOut)
+async def get_kitten(kitten_id: str):
+    if not ObjectId.is_valid(kitten_id):
+        raise HTTPException(status_code=400, detail="Invalid kitten id")
+    if db is None:
+        raise HTTPException(status_code=404, detail="Kitten not found")
+    doc = await get_document("kitten", {"_id": ObjectId(kitten_id)}, KITTEN_PROJECTION)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Kitten not found")
+    return doc
 
 
 @app.post("/api/kittens", response_model=dict)
-def create_kitten(kitten: Kitten):
+async def create_kitten(kitten: Kitten):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    inserted_id = create_document("kitten", kitten)
+    data = kitten.model_dump(mode="json")
+    data["color_lc"] = kitten.color.lower()
+    data["location_lc"] = kitten.location.lower()
+    data["sex"] = kitten.sex.lower()
+    data["status"] = kitten.status.lower()
+    inserted_id = await create_document("kitten", data)
     return {"id": inserted_id}
 
 
@@ -104,10 +323,10 @@ class InquiryResponse(BaseModel):
 
 
 @app.post("/api/inquiries", response_model=InquiryResponse)
-def submit_inquiry(inquiry: Inquiry):
+async def submit_inquiry(inquiry: Inquiry):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    inserted_id = create_document("inquiry", inquiry)
+    inserted_id = await inquiry_writer.submit(inquiry)
     return InquiryResponse(id=inserted_id)
 
 
@@ -117,40 +336,65 @@ def submit_inquiry(inquiry: Inquiry):
 
 class TestimonialOut(Testimonial):
     id: Optional[str] = None
+    avatar_url: Optional[str] = None
+    image_url: Optional[str] = None
+
 
+_TESTIMONIAL_LIST_ADAPTER = TypeAdapter(List[TestimonialOut])
 
-@app.get("/api/testimonials", response_model=List[TestimonialOut])
-def list_testimonials(limit: int = 10):
+
+# graceful fallback with a couple of curated examples, validated once at import
+_FALLBACK_TESTIMONIALS = _TESTIMONIAL_LIST_ADAPTER.validate_python(
+    [
+        {
+            "author": "Sofia R.",
+            "handle": "@sof_and_max",
+            "content": "Our shaded silver boy is massive and so gentle. The FaceTime call sealed our trust—everything was exactly as promised.",
+            "rating": 5,
+            "avatar_url": "https://images.unsplash.com/photo-1607746882042-944635dfe10e?w=200&h=200&fit=crop"
+        },
+        {
+            "author": "Michael T.",
+            "handle": "@mt_angeleno",
+            "content": "Hand delivery to LA was seamless. Genetics and health transparency are top-tier. Couldn’t be happier!",
+            "rating": 5,
+            "avatar_url": "https://images.unsplash.com/photo-1544723795-3fb6469f5b39?w=200&h=200&fit=crop"
+        }
+    ]
+)
+
+
+async def _render_testimonials(limit: int) -> bytes:
     if db is None:
-        # graceful fallback with a couple of curated examples
-        examples = [
-            {
-                "author": "Sofia R.",
-                "handle": "@sof_and_max",
-                "content": "Our shaded silver boy is massive and so gentle. The FaceTime call sealed our trust—everything was exactly as promised.",
-                "rating": 5,
-                "avatar_url": "https://images.unsplash.com/photo-1607746882042-944635dfe10e?w=200&h=200&fit=crop"
-            },
-            {
-                "author": "Michael T.",
-                "handle": "@mt_angeleno",
-                "content": "Hand delivery to LA was seamless. Genetics and health transparency are top-tier. Couldn’t be happier!",
-                "rating": 5,
-                "avatar_url": "https://images.unsplash.com/photo-1544723795-3fb6469f5b39?w=200&h=200&fit=crop"
-            }
-        ]
-        return [TestimonialOut(**e) for e in examples][:limit]
-
-    docs = get_documents("testimonial", {}, limit)
-    out: List[TestimonialOut] = []
-    for d in docs:
-        d["id"] = str(d.get("_id"))
-        d.pop("_id", None)
-        out.append(TestimonialOut(**d))
-    return out
+        out = _FALLBACK_TESTIMONIALS[:limit]
+    else:
+        docs = await get_documents("testimonial", {}, limit, sort=[("_id", -1)])
+        out = [TestimonialOut.model_construct(id=str(d.pop("_id")), **d) for d in docs]
+    return _TESTIMONIAL_LIST_ADAPTER.dump_json(out)
+
+
+@app.get("/api/testimonials", response_model=None, responses={200: {"model": List[TestimonialOut]}})
+async def list_testimonials(request: Request, limit: int = Query(10, ge=1, le=100)):
+    # Cache the serialized body so hits skip both Mongo and encoding; the ETag is
+    # derived from those same bytes
+    backend = FastAPICache.get_backend()
+    key = f"{FastAPICache.get_prefix()}:testimonials:{limit}"
+    body = await backend.get(key)
+    if body is None:
+        body = await _render_testimonials(limit)
+        await backend.set(key, body, expire=60)
+    return _conditional_json(request, body)
 
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+        log_level="warning",
+    )